@@ -1,5 +1,9 @@
+import json
+from bson import ObjectId
+from fastapi.concurrency import run_in_threadpool
 from fastapi import APIRouter
 from pydantic import BaseModel
+from pymongo.errors import DuplicateKeyError
 from datetime import datetime, timezone
 from fastapi import Depends, HTTPException
 
@@ -11,14 +15,24 @@ from app.models.exam import Exam
 from app.models.question import Question
 from app.models.paper import Paper, PaperType
 from app.services.rate_limit import limit_route
+from app.services.cache import cache_get, cache_set
 
 
 router = APIRouter()
 
+_PAPER_LISTING_FIELDS = ("name", "code", "type", "max_score", "duration_minutes")
+_QUESTION_OUTPUT_FIELDS = ("code", "type", "subject_code", "statement", "question_options")
+# Papers are not edited while exams run, so their ordered question lists are safe to memoize briefly
+_ORDERED_QUESTIONS_TTL_SECONDS = 600
+
 
 @router.get("/upcoming")
-def list_upcoming_exams():
+async def list_upcoming_exams():
     """PUBLIC: List exams with start_time in the future."""
+    return await run_in_threadpool(_list_upcoming_exams)
+
+
+def _list_upcoming_exams():
     now = datetime.now(timezone.utc)
     # Filter for exams starting later than now; keep payload lightweight
     exams: list[Exam] = Exam.objects(start_time__gte=now)
@@ -26,38 +40,42 @@ def list_upcoming_exams():
 
 
 @router.get("/papers")
-def list_available_papers():
+async def list_available_papers():
     """PUBLIC: List mock/real papers not scheduled for a future exam."""
+    return await run_in_threadpool(_list_available_papers)
+
+
+def _list_available_papers():
     now = datetime.now(timezone.utc)
-    # Collect paper ids already tied to a future exam to exclude them
-    future_exams: list[Exam] = Exam.objects(start_time__gte=now)
-    future_exam_paper_ids = set(
-        str(exam.paper.id) for exam in future_exams.only("paper")
-    )
+    # Collect raw paper ids already tied to a future exam (no dereference) to exclude them
+    future_exam_paper_ids = Exam._get_collection().distinct("paper", {"start_time": {"$gte": now}})
 
     allowed_types = [PaperType.MOCK.value, PaperType.REAL.value]
-    papers: list[Paper] = Paper.objects(type__in=allowed_types, id__nin=list(future_exam_paper_ids)).order_by("name")
-    return [p.to_dict() for p in papers]
+    papers: list[Paper] = (
+        Paper.objects(type__in=allowed_types, id__nin=future_exam_paper_ids)
+        .only(*_PAPER_LISTING_FIELDS)
+        .order_by("name")
+    )
+    return [p.to_dict(fields=_PAPER_LISTING_FIELDS) for p in papers]
 
 
 class EnrollBody(BaseModel):
     exam_id: str
 
 @router.post("/enroll")
-def enroll(
+async def enroll(
     body: EnrollBody,
     current_user: User = Depends(get_current_user),
 ) -> dict:
     """PROTECTED: Enroll current user into an exam."""
+    return await run_in_threadpool(_enroll, body, current_user)
+
+
+def _enroll(body: EnrollBody, current_user: User) -> dict:
     exam: Exam | None = Exam.objects(id=body.exam_id).first()
     if not exam:
         raise HTTPException(status_code=404, detail="Exam not found")
     
-    # Enforce one attempt per user per exam
-    existing_test_attempt: TestAttempt | None = TestAttempt.objects(exam=exam, user=current_user).first()
-    if existing_test_attempt:
-        raise HTTPException(status_code=409, detail="Already enrolled")
-    
     # Pre-create attempt; actual attempt starts when user begins
     test_attempt = TestAttempt(
         exam=exam,
@@ -68,14 +86,69 @@ def enroll(
         enrolled_on=datetime.now(timezone.utc),
     )
 
-    test_attempt.save()
+    # Insert directly; the unique (exam, user) index enforces one attempt per user per exam
     try:
-        # Keep enrolled counter in sync for analytics
-        exam.enrolled_count = int(exam.enrolled_count or 0) + 1
-        exam.save()
-    except Exception:
-        pass
-    return test_attempt.to_dict()
+        test_attempt.id = TestAttempt._get_collection().insert_one(test_attempt.to_mongo()).inserted_id
+    except DuplicateKeyError:
+        raise HTTPException(status_code=409, detail="Already enrolled")
+
+    # Keep enrolled counter in sync for analytics; atomic so concurrent enrolls are not lost
+    Exam.objects(id=exam.id).update_one(inc__enrolled_count=1)
+    # References go out as ids: the request user only carries auth fields, and walking the
+    # others would dereference full documents just to build the response
+    return test_attempt.to_dict(references_as_ids=True)
+
+
+async def _ordered_questions(paper_id: str) -> list[tuple[str, str]] | None:
+    """Return the paper's ordered (question code, question id) pairs, served from Redis when cached."""
+    key = f"paper:questions:{paper_id}"
+    cached = await cache_get(key)
+    if cached is not None:
+        return [tuple(pair) for pair in json.loads(cached)]
+
+    ordered = await run_in_threadpool(_load_ordered_questions, paper_id)
+    if ordered is not None:
+        await cache_set(key, json.dumps(ordered), ttl_seconds=_ORDERED_QUESTIONS_TTL_SECONDS)
+    return ordered
+
+
+def _load_ordered_questions(paper_id: str) -> list[tuple[str, str]] | None:
+    """Return (code, id) pairs sorted by question order, or None if the paper does not exist."""
+    if not ObjectId.is_valid(paper_id):
+        return None
+    paper_doc = Paper._get_collection().find_one(
+        {"_id": ObjectId(paper_id)},
+        {"ordered_codes": 1, "paper_questions.question": 1},
+    )
+    if paper_doc is None:
+        return None
+    if "ordered_codes" in paper_doc:
+        # paper_questions are stored sorted, so their references line up with ordered_codes
+        question_ids = [pq["question"] for pq in paper_doc.get("paper_questions", [])]
+        return [(code, str(qid)) for code, qid in zip(paper_doc["ordered_codes"], question_ids)]
+
+    # Papers saved before ordered_codes existed: derive the order server-side from the references
+    docs = list(Paper._get_collection().aggregate([
+        {"$match": {"_id": ObjectId(paper_id)}},
+        {"$project": {"question_ids": {"$map": {
+            "input": {"$sortArray": {"input": "$paper_questions", "sortBy": {"order": 1}}},
+            "as": "pq",
+            "in": "$$pq.question",
+        }}}},
+        {"$lookup": {
+            "from": Question._get_collection_name(),
+            "localField": "question_ids",
+            "foreignField": "_id",
+            "pipeline": [{"$project": {"code": 1}}],
+            "as": "questions",
+        }},
+    ]))
+    if not docs:
+        return None
+
+    # $lookup does not preserve order; map ids back onto the sorted id list
+    code_by_id = {q["_id"]: q["code"] for q in docs[0]["questions"]}
+    return [(code_by_id[qid], str(qid)) for qid in docs[0]["question_ids"] if qid in code_by_id]
 
 
 class NextQuestionBody(BaseModel):
@@ -84,35 +157,35 @@ class NextQuestionBody(BaseModel):
 
 
 @router.post("/papers/questions/next", dependencies=[Depends(limit_route(5))])
-def get_next_question(
+async def get_next_question(
     body: NextQuestionBody, 
     current_user: User = Depends(get_current_user),
 ) -> dict:
     """PROTECTED | RATE-LIMITED: Get next question code and payload for a paper."""
-    paper: Paper | None = Paper.objects(id=body.paper_id).first()
-    if not paper:
-        raise HTTPException(status_code=404, detail="Paper not found")
+    ordered = await _ordered_questions(body.paper_id)
+    return await run_in_threadpool(_get_next_question, body, ordered)
 
-    # Determine next code based on order, defaulting to the first if none given
-    ordered = sorted(paper.paper_questions, key=lambda pq: pq.order)
-    codes = [pq.question.code for pq in ordered]
 
-    next_code: str | None
+def _get_next_question(body: NextQuestionBody, ordered: list[tuple[str, str]] | None) -> dict:
+    if ordered is None:
+        raise HTTPException(status_code=404, detail="Paper not found")
+
+    # Determine next question based on order, defaulting to the first if none given
+    next_idx = 0
     if body.current_code:
+        codes = [code for code, _ in ordered]
         try:
-            idx = codes.index(body.current_code)
-            next_code = codes[idx + 1] if idx + 1 < len(codes) else None
+            next_idx = codes.index(body.current_code) + 1
         except ValueError:
-            next_code = codes[0] if codes else None
-    else:
-        next_code = codes[0] if codes else None
+            next_idx = 0
 
-    if not next_code:
+    if next_idx >= len(ordered):
         return {"question": None, "next_code": None}
+    next_code, next_id = ordered[next_idx]
 
-    # Fetch the full question payload for rendering
-    question: Question | None = Question.objects(code=next_code).first()
+    # Fetch the full question payload for rendering via the primary key
+    question: Question | None = Question.objects(id=next_id).only(*_QUESTION_OUTPUT_FIELDS).first()
     if not question:
         raise HTTPException(status_code=404, detail="Question not found")
 
-    return {"question": question.to_output(), "next_code": next_code}
\ No newline at end of file
+    return {"question": question.to_output(fields=_QUESTION_OUTPUT_FIELDS), "next_code": next_code}
\ No newline at end of file
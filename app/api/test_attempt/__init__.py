@@ -1,6 +1,10 @@
+from bson import ObjectId
 from datetime import datetime, timezone
+from functools import lru_cache
+from fastapi.concurrency import run_in_threadpool
 from fastapi import APIRouter, HTTPException, Depends
 from pydantic import BaseModel
+from pymongo.errors import DuplicateKeyError
 
 from app.models.exam import Exam
 from app.models.user import User
@@ -8,23 +12,31 @@ from app.models.submission import Submission
 from app.services.auth import get_current_user
 from app.models.paper import Paper, PaperQuestion
 from app.models.question import Question, QuestionType
-from app.models.test_attempt import TestAttempt, TestStatus, TestType, TestSubjectScore
+from app.models.test_attempt import TestAttempt, TestStatus, TestType
 from app.services.rate_limit import limit_route
 
 
 router = APIRouter()
 
+_SUBMIT_PAPER_FIELDS = ("name", "code", "type", "max_score", "subject_max_scores", "duration_minutes", "updated_at")
+_SINGLE = QuestionType.SINGLE_CORRECT.value
+_MULTI = QuestionType.MULTIPLE_CORRECT.value
+
 
 class StartTestBody(BaseModel):
     paper_id: str
     exam_id: str | None = None
 
 @router.post("/start")
-def start_test(
+async def start_test(
     body: StartTestBody,
     current_user: User = Depends(get_current_user),
 ) -> dict:
     """PROTECTED: Start a test attempt for exam or practice."""
+    return await run_in_threadpool(_start_test, body, current_user)
+
+
+def _start_test(body: StartTestBody, current_user: User) -> dict:
     paper: Paper | None = Paper.objects(id=body.paper_id).first()
     if not paper:
         raise HTTPException(status_code=404, detail="Paper not found")
@@ -50,6 +62,10 @@ def start_test(
 
         test_attempt.started_on = datetime.now(timezone.utc)
         test_attempt.status = TestStatus.IN_PROGRESS.value
+        # Snapshot the window so submissions can check it without dereferencing exam/paper
+        test_attempt.exam_start_time = exam.start_time
+        test_attempt.exam_end_time = exam.end_time
+        test_attempt.paper_duration_minutes = paper.duration_minutes
         test_attempt.save()
     else:
         # Practice flow: create a fresh attempt immediately
@@ -60,22 +76,28 @@ def start_test(
             started_on=datetime.now(timezone.utc),
             status=TestStatus.IN_PROGRESS.value,
             type=TestType.PRACTICE.value,
+            paper_duration_minutes=paper.duration_minutes,
         )
 
         test_attempt.save()
     
-    return test_attempt.to_dict()
+    # References as ids, matching /enroll and /submit
+    return test_attempt.to_dict(references_as_ids=True)
 
 
 class EndTestBody(BaseModel):
     user_test_id: str
 
 @router.post("/end")
-def end_test(
+async def end_test(
     body: EndTestBody,
     current_user: User = Depends(get_current_user),
 ) -> dict:
     """PROTECTED: Mark a test attempt as completed."""
+    return await run_in_threadpool(_end_test, body, current_user)
+
+
+def _end_test(body: EndTestBody, current_user: User) -> dict:
     test_attempt: TestAttempt | None = TestAttempt.objects(id=body.user_test_id, user=current_user).first()
     if not test_attempt:
         raise HTTPException(status_code=404, detail="TestAttempt session not found")
@@ -85,7 +107,8 @@ def end_test(
     test_attempt.status = TestStatus.COMPLETED.value
     test_attempt.ended_on = now
     test_attempt.save()
-    return test_attempt.to_dict()
+    # References as ids, matching /enroll and /submit
+    return test_attempt.to_dict(references_as_ids=True)
 
 
 class SubmitAnswerBody(BaseModel):
@@ -95,78 +118,136 @@ class SubmitAnswerBody(BaseModel):
 
 def _within_time_window(
     user_test: TestAttempt,
+    paper: Paper,
 ) -> bool:
     """Validate if submission is within allowed time window for this attempt."""
     now = datetime.now(timezone.utc)
     if user_test.type == TestType.COMPETITIVE.value:
-        return bool(user_test.exam and user_test.exam.start_time <= now <= user_test.exam.end_time)
+        start_time, end_time = user_test.exam_start_time, user_test.exam_end_time
+        if start_time is None or end_time is None:
+            # Attempts started before the window was denormalized still need the exam
+            if not user_test.exam:
+                return False
+            start_time, end_time = user_test.exam.start_time, user_test.exam.end_time
+        return start_time <= now <= end_time
     if user_test.type == TestType.PRACTICE.value:
-        return bool(user_test.started_on and (now - user_test.started_on).total_seconds() <= user_test.paper.duration_minutes * 60)
+        duration_minutes = user_test.paper_duration_minutes
+        if duration_minutes is None:
+            duration_minutes = paper.duration_minutes
+        return bool(user_test.started_on and (now - user_test.started_on).total_seconds() <= duration_minutes * 60)
     return False
 
+@lru_cache(maxsize=512)
+def _paper_questions_by_id(paper_id: str, updated_at: datetime | None) -> dict[str, PaperQuestion]:
+    """Index a paper's questions by question id; cached per paper version (id, updated_at).
+
+    Reads the raw embedded documents so no question reference is ever dereferenced.
+    """
+    paper_doc = Paper._get_collection().find_one({"_id": ObjectId(paper_id)}, {"paper_questions": 1})
+    if not paper_doc:
+        return {}
+    return {
+        str(pq["question"]): PaperQuestion._from_son(pq)
+        for pq in paper_doc.get("paper_questions", [])
+    }
+
 def _score_submission(
     paper: Paper,
     question: Question,
     options_chosen: list[str],
 ) -> tuple[int, int]:
     """Score a submission based on paper rules and question type, returns (score, max_score)."""
-    by_code = {opt.code: opt for opt in question.question_options}
+    pq: PaperQuestion | None = _paper_questions_by_id(str(paper.id), paper.updated_at).get(str(question.id))
+    if pq is None:
+        raise HTTPException(status_code=404, detail="Question not found in paper")
+
     chosen_set = set(options_chosen or [])
-    correct_set = {opt.code for opt in question.question_options if getattr(opt, "correct", False)}
-
-    paper_questions: list[PaperQuestion] = paper.paper_questions
-    for pq in paper_questions:
-        if pq.question.code != question.code:
-            continue
-
-        if not chosen_set and pq.mandatory:
-            # Mandatory questions must be answered
-            raise HTTPException(status_code=409, detail="Mandatory question needs to be answered")
-
-        if any(code not in by_code for code in chosen_set):
-            # Any invalid code counts as a wrong selection
-            return (-int(pq.negative_score), pq.positive_score)
-
-        if chosen_set - correct_set:
-            # Any wrong selection in the set yields negative marks
-            return (-int(pq.negative_score), pq.positive_score)
-
-        qtype = str(question.type)
-        if qtype == QuestionType.SINGLE_CORRECT.value:
-            # Single-correct: full positive if answered correctly, zero if blank
-            if not chosen_set:
-                return (0, pq.positive_score)
-            return (int(pq.positive_score), pq.positive_score)
-
-        if qtype == QuestionType.MULTIPLE_CORRECT.value:
-            # Multiple-correct: proportional to sum of weights of chosen correct options
-            total_weight = 0
-            for code in chosen_set:
-                opt = by_code.get(code)
-                if getattr(opt, "correct", False):
-                    total_weight += int(getattr(opt, "weight", 0) or 0)
-            score = (total_weight * pq.positive_score) / 100
-            return (score, pq.positive_score)
-
-        return (0, pq.positive_score)
-
-    raise HTTPException(status_code=404, detail="Question not found in paper")
+    option_codes, correct_weights = question.scoring_table
+
+    if not chosen_set and pq.mandatory:
+        # Mandatory questions must be answered
+        raise HTTPException(status_code=409, detail="Mandatory question needs to be answered")
+
+    if not chosen_set.issubset(option_codes):
+        # Any invalid code counts as a wrong selection
+        return (-int(pq.negative_score), pq.positive_score)
+
+    if not chosen_set.issubset(correct_weights):
+        # Any wrong selection in the set yields negative marks
+        return (-int(pq.negative_score), pq.positive_score)
+
+    qtype = str(question.type)
+    if qtype == _SINGLE:
+        # Single-correct: full positive if answered correctly, zero if blank
+        if not chosen_set:
+            return (0, pq.positive_score)
+        return (int(pq.positive_score), pq.positive_score)
+
+    if qtype == _MULTI:
+        # Multiple-correct: proportional to sum of weights of chosen correct options
+        total_weight = sum(correct_weights[code] for code in chosen_set)
+        score = (total_weight * pq.positive_score) / 100
+        return (score, pq.positive_score)
+
+    return (0, pq.positive_score)
+
+def _increment_attempt_scores(
+    attempt_id: ObjectId,
+    subject_code: str,
+    score: int,
+    max_total_score: int,
+    subject_max_score: int,
+) -> None:
+    """Atomically add a submission score to the attempt total and its subject bucket."""
+    collection = TestAttempt._get_collection()
+    now = datetime.now(timezone.utc)
+    # Existing subject bucket: bump it in place via the positional operator
+    bump_existing = (
+        {"_id": attempt_id, "subject_scores.subject_code": subject_code},
+        {
+            "$inc": {"total_score": score, "subject_scores.$.total_score": score},
+            "$set": {"max_total_score": max_total_score, "subject_scores.$.max_total_score": subject_max_score, "updated_at": now},
+        },
+    )
+    # First submission for this subject: append the bucket unless another request just did
+    push_new = (
+        {"_id": attempt_id, "subject_scores.subject_code": {"$ne": subject_code}},
+        {
+            "$inc": {"total_score": score},
+            "$set": {"max_total_score": max_total_score, "updated_at": now},
+            "$push": {"subject_scores": {"total_score": score, "subject_code": subject_code, "max_total_score": subject_max_score}},
+        },
+    )
+    # A lost race on the push means the bucket now exists, so one retry of the bump suffices
+    for _ in range(2):
+        for filter_, update in (bump_existing, push_new):
+            if collection.update_one(filter_, update).matched_count:
+                return
 
 @router.post("/submit", dependencies=[Depends(limit_route(5))])
-def submit_answer(
+async def submit_answer(
     body: SubmitAnswerBody,
     current_user: User = Depends(get_current_user),
 ) -> dict:
     """PROTECTED | RATE-LIMITED: Submit an answer for a question within an in-progress attempt."""
+    return await run_in_threadpool(_submit_answer, body, current_user)
+
+
+def _submit_answer(body: SubmitAnswerBody, current_user: User) -> dict:
     # Resolve the attempt and ensure user owns it
     test_attempt: TestAttempt | None = TestAttempt.objects(id=body.user_test_id, user=current_user).first()
     if not test_attempt or test_attempt.status != TestStatus.IN_PROGRESS.value:
         raise HTTPException(status_code=409, detail="User test not in progress")
+
+    # Load only the paper fields scoring needs instead of dereferencing the full paper
+    paper: Paper | None = Paper.objects(id=test_attempt._data["paper"].id).only(*_SUBMIT_PAPER_FIELDS).first()
+    if not paper:
+        raise HTTPException(status_code=404, detail="Paper not found")
+
     # Also protect against submissions outside allowed time window
-    if not _within_time_window(test_attempt):
+    if not _within_time_window(test_attempt, paper):
         raise HTTPException(status_code=403, detail="Submission outside allowed window")
 
-    paper: Paper | None = test_attempt.paper
     question: Question | None = Question.objects(id=body.question_id).first()
     if not question:
         raise HTTPException(status_code=404, detail="Question not found")
@@ -177,51 +258,56 @@ def submit_answer(
         paper=paper, 
     )
 
-    # Record immutable submission; unique index prevents duplicates
+    # Record immutable submission as a raw insert (no ODM validation); unique index prevents duplicates
+    now = datetime.now(timezone.utc)
     submission = Submission(
-        score=score,
+        score=int(score),
         paper=paper,
         user=current_user,
         question=question,
-        max_score=max_score,
+        max_score=int(max_score),
         test_attempt=test_attempt,
         options_chosen=body.options_chosen,
         subject_code=str(question.subject_code),
+        submitted_at=now,
+        created_at=now,
+        updated_at=now,
     )
     try:
-        submission.save()
-    except Exception:
+        submission.id = Submission._get_collection().insert_one({
+            "user": current_user.id,
+            "paper": paper.id,
+            "question": question.id,
+            "test_attempt": test_attempt.id,
+            "options_chosen": list(body.options_chosen),
+            "subject_code": submission.subject_code,
+            "submitted_at": now,
+            "max_score": submission.max_score,
+            "score": submission.score,
+            "metadata": {},
+            "created_at": now,
+            "updated_at": now,
+        }).inserted_id
+    except DuplicateKeyError:
         raise HTTPException(status_code=409, detail="Already submitted for this question")
 
     try:
         # Maintain lightweight aggregates for live progress
-        test_attempt.total_score = int(test_attempt.total_score or 0) + int(score)
-        if paper is not None:
-            paper_max = int(getattr(paper, "max_score", 0) or 0)
-            if int(test_attempt.max_total_score or 0) != paper_max:
-                test_attempt.max_total_score = paper_max
-
-        # Ensure subject bucket reflects this submission's subject
+        paper_max = int(getattr(paper, "max_score", 0) or 0)
         subject_max_map = {ps.subject_code: int(ps.max_score or 0) for ps in (getattr(paper, "subject_max_scores", []) or [])}
         subj_code = str(question.subject_code)
-        subj_max = subject_max_map.get(subj_code, 0)
-
-        by_subj = {ss.subject_code: ss for ss in (test_attempt.subject_scores or [])}
-        current = by_subj.get(subj_code)
-        if current:
-            current.total_score = int(getattr(current, "total_score", 0) or 0) + int(score)
-            current.max_total_score = int(subj_max)
-        else:
-            test_attempt.subject_scores.append(TestSubjectScore(
-                subject_code=subj_code,
-                total_score=int(score),
-                max_total_score=int(subj_max),
-            ))
-
-        # Persist aggregates; ignore transient failures to keep submission path fast
-        test_attempt.save()
+        _increment_attempt_scores(
+            attempt_id=test_attempt.id,
+            subject_code=subj_code,
+            score=int(score),
+            max_total_score=paper_max,
+            subject_max_score=subject_max_map.get(subj_code, 0),
+        )
     except Exception:
+        # Ignore transient failures to keep submission path fast
         pass
 
-    return submission.to_dict()
+    # References go out as ids: walking them would dereference the attempt's exam and paper
+    # (with all their questions) just to build the response
+    return submission.to_dict(references_as_ids=True)
 
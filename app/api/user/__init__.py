@@ -1,15 +1,18 @@
+from fastapi.concurrency import run_in_threadpool
 from fastapi import APIRouter, HTTPException, Depends
 from fastapi.security import OAuth2PasswordRequestForm
 from pydantic import BaseModel, EmailStr
-from jose import jwt, JWTError
+from jose import JWTError
 
 from app.models.user import User
-from app.utils.config import settings
 from app.services.auth import (
     TokenPair,
-    verify_password,
+    dummy_verify_password,
+    verify_and_update_password,
     get_current_user,
+    revoke_tokens,
     create_tokens,
+    decode_token,
     hash_password,
 )
 
@@ -23,7 +26,11 @@ class SignupBody(BaseModel):
     password: str
 
 @router.post("/signup", response_model=TokenPair)
-def signup(body: SignupBody) -> TokenPair:
+async def signup(body: SignupBody) -> TokenPair:
+    return await run_in_threadpool(_signup, body)
+
+
+def _signup(body: SignupBody) -> TokenPair:
     # Reject duplicate email signups early
     if User.objects(email=body.email).first():
         raise HTTPException(status_code=409, detail="Email already registered")
@@ -34,12 +41,23 @@ def signup(body: SignupBody) -> TokenPair:
 
 
 @router.post("/login", response_model=TokenPair)
-def login(form_data: OAuth2PasswordRequestForm = Depends()) -> TokenPair:
+async def login(form_data: OAuth2PasswordRequestForm = Depends()) -> TokenPair:
+    return await run_in_threadpool(_login, form_data)
+
+
+def _login(form_data: OAuth2PasswordRequestForm) -> TokenPair:
     # Find user by email (username field of OAuth2PasswordRequestForm)
-    user = User.objects(email=form_data.username).first()
+    user = User.objects(email=form_data.username).only("email", "password", "token_version", "name").first()
     # Validate password; avoid leaking whether email exists
-    if not user or not verify_password(form_data.password, user.password):
+    if not user:
+        dummy_verify_password(form_data.password)
+        raise HTTPException(status_code=401, detail="Invalid credentials")
+    verified, new_hash = verify_and_update_password(form_data.password, user.password)
+    if not verified:
         raise HTTPException(status_code=401, detail="Invalid credentials")
+    if new_hash:
+        # Transparently migrate legacy bcrypt hashes to argon2id
+        User.objects(id=user.id).update_one(set__password=new_hash)
     return create_tokens(user)
 
 
@@ -47,10 +65,14 @@ class RefreshBody(BaseModel):
     refresh_token: str
 
 @router.post("/refresh", response_model=TokenPair)
-def refresh_token(body: RefreshBody) -> TokenPair:
+async def refresh_token(body: RefreshBody) -> TokenPair:
+    return await run_in_threadpool(_refresh_token, body)
+
+
+def _refresh_token(body: RefreshBody) -> TokenPair:
     # Decode refresh token and validate token type
     try:
-        payload = jwt.decode(body.refresh_token, settings.jwt_secret_key, algorithms=[settings.jwt_algorithm])
+        payload = decode_token(body.refresh_token)
         if payload.get("typ") != "refresh":
             raise JWTError()
         user_id: str = payload.get("sub")
@@ -59,17 +81,20 @@ def refresh_token(body: RefreshBody) -> TokenPair:
         raise HTTPException(status_code=401, detail="Invalid refresh token")
     
     # Ensure the user exists and token version matches (not logged out)
-    user = User.objects(id=user_id).first()
+    user = User.objects(id=user_id).only("email", "token_version", "name").first()
     if not user or user.token_version != token_version:
         raise HTTPException(status_code=401, detail="Invalid refresh token")
     return create_tokens(user)
 
 
 @router.post("/logout")
-def logout(current_user: User = Depends(get_current_user)) -> dict:
-    # Bump token_version so existing tokens become invalid immediately
-    current_user.token_version = str(int(current_user.token_version) + 1)
-    current_user.save()
+async def logout(current_user: User = Depends(get_current_user)) -> dict:
+    await run_in_threadpool(_logout, current_user)
     return {"status": True}
 
 
+def _logout(current_user: User) -> None:
+    # Bump token_version so existing tokens become invalid immediately
+    revoke_tokens(str(current_user.id), current_user.token_version)
+
+
@@ -9,7 +9,15 @@ from app.utils.config import settings
 
 
 def init_mongo() -> None:
-    connect(host=settings.mongo_uri, alias="default", tlsCAFile=certifi.where(), tz_aware=True)
+    connect(
+        host=settings.mongo_uri,
+        alias="default",
+        tlsCAFile=certifi.where(),
+        tz_aware=True,
+        maxPoolSize=settings.mongo_max_pool_size,
+        minPoolSize=settings.mongo_min_pool_size,
+        compressors=settings.mongo_compressors,
+    )
 
 
 def close_mongo() -> None:
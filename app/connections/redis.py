@@ -1,4 +1,5 @@
 import redis
+import redis.asyncio as aioredis
 from contextlib import asynccontextmanager
 from typing import AsyncIterator, Optional
 from fastapi import FastAPI
@@ -7,6 +8,9 @@ from app.utils.config import settings
 
 
 _redis_client: Optional[redis.Redis] = None
+_redis_pool: Optional[redis.BlockingConnectionPool] = None
+_async_redis_client: Optional[aioredis.Redis] = None
+_async_redis_pool: Optional[aioredis.BlockingConnectionPool] = None
 
 
 def get_redis() -> redis.Redis:
@@ -14,33 +18,76 @@ def get_redis() -> redis.Redis:
     return _redis_client
 
 
+def get_async_redis() -> aioredis.Redis:
+    assert _async_redis_client is not None, "Redis not initialized"
+    return _async_redis_client
+
+
+def _pool_kwargs() -> dict:
+    return {
+        "max_connections": getattr(settings, "redis_max_connections", 100),
+        "timeout": 2.0,
+        "db": getattr(settings, "redis_db", 0),
+        "port": getattr(settings, "redis_port", 6379),
+        "host": getattr(settings, "redis_host", "localhost"),
+        "password": getattr(settings, "redis_password", None),
+        "decode_responses": True,
+        "socket_timeout": 2.0,
+        "socket_keepalive": True,
+    }
+
+
 def init_redis() -> None:
-    global _redis_client
-    _redis_client = redis.Redis(
-        db=getattr(settings, "redis_db", 0),
-        port=getattr(settings, "redis_port", 6379),
-        host=getattr(settings, "redis_host", "localhost"),
-        password=getattr(settings, "redis_password", None),
-        decode_responses=True,
-        socket_timeout=2.0,
-    )
+    global _redis_client, _redis_pool
+    # Bounded pool shared by all requests; callers wait for a free connection instead of
+    # opening new ones. The hiredis parser is picked up automatically when installed.
+    _redis_pool = redis.BlockingConnectionPool(**_pool_kwargs())
+    _redis_client = redis.Redis(connection_pool=_redis_pool)
+
+
+def init_async_redis() -> None:
+    global _async_redis_client, _async_redis_pool
+    # Request handlers await this client so Redis round-trips never block the event loop;
+    # the sync client above stays for RQ and other thread-bound callers.
+    _async_redis_pool = aioredis.BlockingConnectionPool(**_pool_kwargs())
+    _async_redis_client = aioredis.Redis(connection_pool=_async_redis_pool)
 
 
 def close_redis() -> None:
-    global _redis_client
-    if _redis_client is not None:
-        try:
+    global _redis_client, _redis_pool
+    try:
+        if _redis_client is not None:
             _redis_client.close()
-        finally:
-            _redis_client = None
+    finally:
+        # The client does not own an explicitly passed pool, so disconnect it here
+        if _redis_pool is not None:
+            _redis_pool.disconnect()
+        _redis_client = None
+        _redis_pool = None
+
+
+async def close_async_redis() -> None:
+    global _async_redis_client, _async_redis_pool
+    try:
+        if _async_redis_client is not None:
+            await _async_redis_client.aclose()
+    finally:
+        if _async_redis_pool is not None:
+            await _async_redis_pool.disconnect()
+        _async_redis_client = None
+        _async_redis_pool = None
 
 
 @asynccontextmanager
 async def redis_lifespan(app: FastAPI) -> AsyncIterator[None]:
     init_redis()
+    init_async_redis()
     try:
         yield
     finally:
-        close_redis()
+        try:
+            await close_async_redis()
+        finally:
+            close_redis()
 
 
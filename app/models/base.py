@@ -1,41 +1,127 @@
 from datetime import datetime, timezone
-from typing import Any
+from typing import Any, Callable
+from bson.dbref import DBRef
 from bson.objectid import ObjectId
-from mongoengine import Document, DictField, DateTimeField, EmbeddedDocument
+from mongoengine import (
+    Document, DictField, DateTimeField, EmbeddedDocument, EmbeddedDocumentField, ListField, ObjectIdField,
+    ReferenceField, StringField, IntField, FloatField, BooleanField,
+)
+
+
+def _sanitize_value(value: Any) -> Any:
+    """Generic, type-inspecting conversion used for values without a specialised serializer."""
+    if isinstance(value, Document):
+        return value.to_output() if hasattr(value, "to_output") else str(value.id)
+    elif isinstance(value, EmbeddedDocument):
+        value = {k: _sanitize_value(getattr(value, k)) for k in value._fields}
+    if isinstance(value, list):
+        return [_sanitize_value(v) for v in value]
+    if isinstance(value, dict):
+        return {k: _sanitize_value(v) for k, v in value.items()}
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, ObjectId):
+        return str(value)
+    return value
+
+
+def _serialize_scalar(value: Any) -> Any:
+    return value
+
+
+def _serialize_datetime(value: Any) -> Any:
+    return value.isoformat() if value is not None else None
+
+
+def _serialize_object_id(value: Any) -> Any:
+    return str(value) if value is not None else None
+
+
+def _serialize_reference(value: Any) -> Any:
+    if isinstance(value, Document):
+        return value.to_output() if hasattr(value, "to_output") else str(value.id)
+    return _sanitize_value(value)
+
+
+def _reference_id(value: Any) -> Any:
+    """Id of a stored reference without dereferencing it (raw value is a DBRef, document or ObjectId)."""
+    if value is None:
+        return None
+    if isinstance(value, (Document, DBRef)):
+        return str(value.id)
+    return str(value)
+
+
+def _serialize_embedded(value: Any) -> Any:
+    if isinstance(value, BaseDocumentMixin):
+        return {name: serialize(getattr(value, name)) for name, serialize in type(value)._output_serializers().items()}
+    return _sanitize_value(value)
+
+
+def _field_serializer(field: Any) -> Callable[[Any], Any]:
+    """Pick a converter for a schema field once, so to_output avoids per-value type inspection."""
+    if isinstance(field, ReferenceField):
+        return _serialize_reference
+    if isinstance(field, EmbeddedDocumentField):
+        return _serialize_embedded
+    if isinstance(field, ListField) and field.field is not None:
+        serialize_item = _field_serializer(field.field)
+        if serialize_item is _serialize_scalar:
+            return lambda value: list(value) if value is not None else None
+        return lambda value: [serialize_item(v) for v in value] if value is not None else None
+    # Routes return plain dicts that FastAPI encodes before the response class sees them, so
+    # datetimes are formatted here to keep one isoformat() shape across every endpoint
+    if isinstance(field, DateTimeField):
+        return _serialize_datetime
+    if isinstance(field, ObjectIdField):
+        return _serialize_object_id
+    if isinstance(field, (StringField, IntField, FloatField, BooleanField)):
+        return _serialize_scalar
+    return _sanitize_value
 
 
 class BaseDocumentMixin:
-    def _sanitize_value(self, value: Any) -> Any:
-        if isinstance(value, Document):
-            return value.to_output() if hasattr(value, "to_output") else str(value.id)
-        elif isinstance(value, EmbeddedDocument):
-            value = {k: self._sanitize_value(getattr(value, k)) for k in value._fields}
-        if isinstance(value, list):
-            return [self._sanitize_value(v) for v in value]
-        if isinstance(value, dict):
-            return {k: self._sanitize_value(v) for k, v in value.items()}
-        if isinstance(value, datetime):
-            return value.isoformat()
-        if isinstance(value, ObjectId):
-            return str(value)
-        return value
-
-    def to_output(self, fields=None, exclude=None):
+    @classmethod
+    def _output_serializers(cls) -> dict[str, Callable[[Any], Any]]:
+        """Per-field converters for this class, built lazily from `_fields` and cached on the class."""
+        serializers = cls.__dict__.get("_output_serializer_map")
+        if serializers is None:
+            serializers = {name: _field_serializer(field) for name, field in cls._fields.items()}
+            cls._output_serializer_map = serializers
+        return serializers
+
+    @classmethod
+    def _reference_fields(cls) -> frozenset[str]:
+        """Names of this class's reference fields, cached on the class like the serializers."""
+        names = cls.__dict__.get("_reference_field_names")
+        if names is None:
+            names = frozenset(name for name, field in cls._fields.items() if isinstance(field, ReferenceField))
+            cls._reference_field_names = names
+        return names
+
+    def to_output(self, fields=None, exclude=None, references_as_ids=False):
+        """Serialize the document; with `references_as_ids`, references are emitted as id strings
+        read from the stored value, so nothing is dereferenced."""
         data: dict[str, Any] = {}
         exclude = exclude or []
         fields = fields or self._fields.keys()
+        serializers = type(self)._output_serializers()
+        references = type(self)._reference_fields() if references_as_ids else frozenset()
 
         for field in fields:
             if field in exclude:
                 continue
+            if field in references:
+                data[field] = _reference_id(self._data.get(field))
+                continue
             value = getattr(self, field)
-            data[field] = self._sanitize_value(value)
+            data[field] = serializers.get(field, _sanitize_value)(value)
 
         data["id"] = str(self.id)
         return data
 
-    def to_dict(self, fields=None, exclude=None):
-        return self.to_output(fields=fields, exclude=exclude)
+    def to_dict(self, fields=None, exclude=None, references_as_ids=False):
+        return self.to_output(fields=fields, exclude=exclude, references_as_ids=references_as_ids)
 
 class BaseEmbeddedDocument(EmbeddedDocument, BaseDocumentMixin):
     meta = {
@@ -40,10 +40,11 @@ class Paper(BaseDocument):
     Fields:
     - name/code (str)
     - type (str): real/mock/internal
-    - max_score (int): sum of positive_score of all paper_questions
+    - max_score (int): sum of positive_score of all paper_questions, recomputed on save
     - subject_max_scores (list): per-subject max
     - duration_minutes (int)
-    - paper_questions (list[PaperQuestion])
+    - paper_questions (list[PaperQuestion]): stored sorted by order
+    - ordered_codes (list[str]): question codes in paper order, denormalized on save
     """
     name = StringField(required=True, null=False)
     code = StringField(required=True, null=False, unique=True)
@@ -53,6 +54,7 @@ class Paper(BaseDocument):
     duration_minutes = IntField(required=True, null=False)
 
     paper_questions = ListField(EmbeddedDocumentField(PaperQuestion), null=False, default=list)
+    ordered_codes = ListField(StringField(), null=False, default=list)
 
     meta = {
         "collection": "papers",
@@ -61,3 +63,9 @@ class Paper(BaseDocument):
             {"fields": ["name"]},
         ],
     }
+
+    def clean(self):
+        # Store questions pre-sorted so readers never have to sort per request
+        self.paper_questions = sorted(self.paper_questions, key=lambda pq: pq.order)
+        self.ordered_codes = [pq.question.code for pq in self.paper_questions]
+        self.max_score = sum(int(pq.positive_score or 0) for pq in self.paper_questions)
@@ -1,3 +1,4 @@
+from functools import cached_property
 from mongoengine import StringField, ListField, URLField, ValidationError, BooleanField, IntField, EmbeddedDocumentField
 
 from app.utils.base import BaseEnum, SubjectCode
@@ -69,8 +70,15 @@ class Question(BaseDocument):
         if total_weight != 100:
             raise ValidationError("Total weight of correct options should be 100")
 
-    def to_output(self, fields=None, exclude=None):
-        output = super().to_output(fields, exclude)
+    @cached_property
+    def scoring_table(self) -> tuple[frozenset[str], dict[str, int]]:
+        """(all option codes, correct option code -> weight), built once per loaded question."""
+        option_codes = frozenset(opt.code for opt in self.question_options)
+        correct_weights = {opt.code: int(opt.weight or 0) for opt in self.question_options if opt.correct}
+        return option_codes, correct_weights
+
+    def to_output(self, fields=None, exclude=None, references_as_ids=False):
+        output = super().to_output(fields, exclude, references_as_ids)
         
         new_question_options = []
         question_options = output.pop("question_options")
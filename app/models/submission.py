@@ -29,7 +29,7 @@ class Submission(BaseDocument):
     subject_code = StringField(required=True, null=False, choices=SubjectCode.choices())
     submitted_at = DateTimeField(default=lambda: datetime.now(timezone.utc), null=False)
     max_score = IntField(required=True, null=False, default=0, min_value=0)
-    score = IntField(required=True, null=False, default=0, min_value=0)
+    score = IntField(required=True, null=False, default=0)
 
     meta = {
         "collection": "submissions",
@@ -1,4 +1,4 @@
-from mongoengine import ReferenceField, DateTimeField, StringField, IntField, ListField, FloatField, EmbeddedDocumentField
+from mongoengine import ReferenceField, DateTimeField, StringField, IntField, ListField, FloatField, EmbeddedDocumentField, ValidationError
 
 from app.models.exam import Exam
 from app.models.user import User
@@ -19,6 +19,15 @@ class TestStatus(BaseEnum):
     CANCELLED = "CANCELLED"
 
 
+_SUBJECT_CODES = frozenset(value for value, _ in SubjectCode.choices())
+
+
+def _validate_subject_code(value: str) -> None:
+    # Set membership check; `choices=` rebuilds its choice list and sets on every validation
+    if value not in _SUBJECT_CODES:
+        raise ValidationError(f"Value must be one of {sorted(_SUBJECT_CODES)}")
+
+
 class TestSubjectScore(BaseEmbeddedDocument):
     """Embedded: per-subject score and standings for an attempt.
 
@@ -30,7 +39,7 @@ class TestSubjectScore(BaseEmbeddedDocument):
     - rank (int|None).
     """
     total_score = IntField(required=True, null=False)
-    subject_code = StringField(required=True, null=False, choices=SubjectCode.choices())
+    subject_code = StringField(required=True, null=False, validation=_validate_subject_code)
     max_total_score = IntField(required=True, null=False)
     percentile = FloatField(required=False, null=True)
     rank = IntField(required=False, null=True)
@@ -42,6 +51,7 @@ class TestAttempt(BaseDocument):
     Fields:
     - paper/user/exam (refs)
     - status/type and timestamps
+    - exam_start_time/exam_end_time/paper_duration_minutes: window snapshot taken at start
     - total_score/max_total_score (int)
     - subject_scores (list[TestSubjectScore])
     - percentile/rank: computed in aftermath
@@ -54,7 +64,11 @@ class TestAttempt(BaseDocument):
     started_on = DateTimeField(required=False, null=True)
     enrolled_on = DateTimeField(required=False, null=True)
     concluded_on = DateTimeField(required=False, null=True)
-    
+
+    exam_start_time = DateTimeField(required=False, null=True)
+    exam_end_time = DateTimeField(required=False, null=True)
+    paper_duration_minutes = IntField(required=False, null=True)
+
     type = StringField(required=True, null=False, choices=TestType.choices())
     status = StringField(required=True, null=False, choices=TestStatus.choices())
 
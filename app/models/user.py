@@ -8,7 +8,7 @@ class User(BaseDocument):
     Fields:
     - name (str): Full name
     - email (EmailStr, unique): Login identifier
-    - password (str, hashed): Bcrypt-hashed password
+    - password (str, hashed): argon2id (or legacy bcrypt) hashed password
     - token_version (str): Incremented on logout to invalidate tokens
     """
     name = StringField(required=True, null=False)
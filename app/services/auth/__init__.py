@@ -1,18 +1,58 @@
-from datetime import datetime, timedelta, timezone
+import time
+from datetime import datetime, timezone
+from functools import lru_cache
 
 from fastapi import Depends, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordBearer
+from bson import ObjectId
 from passlib.context import CryptContext
-from jose import jwt, JWTError
+from jose import jwt, JWTError, ExpiredSignatureError
 from pydantic import BaseModel
+from redis.commands.core import Script
 
+from app.connections.redis import get_redis
 from app.models.user import User
 from app.utils.config import settings
+from app.services.cache import cache_get, cache_set_if_absent
 
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# argon2id for new hashes; bcrypt stays verifiable and is upgraded on next successful login
+pwd_context = CryptContext(
+    schemes=["argon2", "bcrypt"],
+    deprecated="auto",
+    argon2__time_cost=2,
+    argon2__memory_cost=19456,
+    argon2__parallelism=1,
+)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/user/login")
 
+_JWT_KEY = settings.jwt_secret_key
+_JWT_ALGORITHM = settings.jwt_algorithm
+_JWT_ALGS = [_JWT_ALGORITHM]
+
+_ACCESS_TOKEN_TTL_SECONDS = settings.access_token_expires_minutes * 60
+_REFRESH_TOKEN_TTL_SECONDS = settings.refresh_token_expires_days * 86400
+# No token outlives the refresh lifetime, so a cached version is never needed for longer
+_TOKEN_VERSION_TTL_SECONDS = _REFRESH_TOKEN_TTL_SECONDS
+
+# Versions only ever grow, so the write-through moves the cached value forward and never back.
+# A cache-miss fill racing a logout therefore cannot restore the version the logout revoked.
+_TOKEN_VERSION_LUA = """
+local current = redis.call('GET', KEYS[1])
+if current and tonumber(current) >= tonumber(ARGV[1]) then
+    return 0
+end
+redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[2])
+return 1
+"""
+
+_token_version_script: Script | None = None
+
+
+# Verified against when the user does not exist so unknown emails cost the same as bad passwords
+_DUMMY_PASSWORD_HASH = pwd_context.hash("dummy-password")
+
 
 class TokenPair(BaseModel):
     """Pair of JWT tokens used by the client for auth and refresh."""
@@ -22,26 +62,36 @@ class TokenPair(BaseModel):
 
 
 def verify_password(plain: str, hashed: str) -> bool:
-    """Verify plaintext password against a bcrypt hash."""
+    """Verify plaintext password against a stored argon2/bcrypt hash."""
     return pwd_context.verify(plain, hashed)
 
 
+def verify_and_update_password(plain: str, hashed: str) -> tuple[bool, str | None]:
+    """Verify a password and return a replacement hash if the stored one uses a deprecated scheme."""
+    return pwd_context.verify_and_update(plain, hashed)
+
+
+def dummy_verify_password(plain: str) -> None:
+    """Spend one verification on a fixed hash to keep unknown-user logins constant-time."""
+    pwd_context.verify(plain, _DUMMY_PASSWORD_HASH)
+
+
 def hash_password(plain: str) -> str:
-    """Hash a plaintext password using bcrypt."""
+    """Hash a plaintext password using argon2id."""
     return pwd_context.hash(plain)
 
 
-def create_token(subject: str, token_version: str, expires_delta: timedelta, token_type: str) -> str:
+def create_token(subject: str, token_version: str, expires_in_seconds: int, token_type: str) -> str:
     """Create a signed JWT with subject, token version, expiration and type."""
-    now = datetime.now(timezone.utc)
+    now_s = int(time.time())
     payload = {
         "sub": subject,
-        "iat": int(now.timestamp()),
-        "exp": int((now + expires_delta).timestamp()),
+        "iat": now_s,
+        "exp": now_s + expires_in_seconds,
         "tv": token_version,
         "typ": token_type,
     }
-    return jwt.encode(payload, settings.jwt_secret_key, algorithm=settings.jwt_algorithm)
+    return jwt.encode(payload, _JWT_KEY, algorithm=_JWT_ALGORITHM)
 
 
 def create_tokens(user: User) -> TokenPair:
@@ -49,25 +99,40 @@ def create_tokens(user: User) -> TokenPair:
     access = create_token(
         subject=str(user.id),
         token_version=user.token_version,
-        expires_delta=timedelta(minutes=settings.access_token_expires_minutes),
+        expires_in_seconds=_ACCESS_TOKEN_TTL_SECONDS,
         token_type="access",
     )
     refresh = create_token(
         subject=str(user.id),
         token_version=user.token_version,
-        expires_delta=timedelta(days=settings.refresh_token_expires_days),
+        expires_in_seconds=_REFRESH_TOKEN_TTL_SECONDS,
         token_type="refresh",
     )
     return TokenPair(access_token=access, refresh_token=refresh)
 
 
-def get_current_user(token: str = Depends(oauth2_scheme)) -> User:
+@lru_cache(maxsize=10_000)
+def _decode_verified(token: str) -> dict:
+    # Only successful decodes are memoized; the secret and algorithm are process constants
+    return jwt.decode(token, _JWT_KEY, algorithms=_JWT_ALGS)
+
+
+def decode_token(token: str) -> dict:
+    """Verify and decode a JWT, reusing the verified payload for repeat tokens until expiry."""
+    payload = _decode_verified(token)
+    if payload.get("exp", 0) <= time.time():
+        raise ExpiredSignatureError("Signature has expired.")
+    return dict(payload)
+
+
+async def get_current_user(token: str = Depends(oauth2_scheme)) -> User:
     """Auth dependency that validates an access token and returns the user.
 
-    Rejects invalid tokens and tokens with mismatched token versions (logout).
+    Rejects invalid tokens and tokens with mismatched token versions (logout). The
+    returned user only carries `id` and `token_version`.
     """
     try:
-        payload = jwt.decode(token, settings.jwt_secret_key, algorithms=[settings.jwt_algorithm])
+        payload = decode_token(token)
         user_id: str = payload.get("sub")
         token_version: str = payload.get("tv")
         typ: str = payload.get("typ")
@@ -76,9 +141,60 @@ def get_current_user(token: str = Depends(oauth2_scheme)) -> User:
     except JWTError:
         raise HTTPException(status_code=401, detail="Could not validate credentials")
     
-    user = User.objects(id=user_id).first()
-    if not user or user.token_version != token_version:
+    current_version = await _current_token_version(user_id)
+    if current_version is None or current_version != token_version:
         raise HTTPException(status_code=401, detail="Could not validate credentials")
-    return user
+    return User._from_son({"_id": ObjectId(user_id), "token_version": current_version})
+
 
+def _token_version_key(user_id: str) -> str:
+    return f"user:tv:{user_id}"
 
+
+def _find_token_version(user_id: str) -> str | None:
+    doc = User.objects(id=user_id).only("token_version").as_pymongo().first()
+    return doc.get("token_version") if doc else None
+
+
+async def _current_token_version(user_id: str) -> str | None:
+    """Return the user's live token version from Redis, falling back to MongoDB on a miss."""
+    current_version = await cache_get(_token_version_key(user_id))
+    if current_version is not None:
+        return current_version
+
+    current_version = await run_in_threadpool(_find_token_version, user_id)
+    if current_version is not None:
+        # Only fill an empty slot; a version written through by a concurrent logout must win
+        await cache_set_if_absent(_token_version_key(user_id), current_version, ttl_seconds=_TOKEN_VERSION_TTL_SECONDS)
+    return current_version
+
+
+def _get_token_version_script() -> Script:
+    """Register the token-version script once per Redis client and reuse it (EVALSHA)."""
+    global _token_version_script
+    client = get_redis()
+    if _token_version_script is None or _token_version_script.registered_client is not client:
+        _token_version_script = client.register_script(_TOKEN_VERSION_LUA)
+    return _token_version_script
+
+
+def _remember_token_version(user_id: str, token_version: str) -> None:
+    """Write through the user's current token version; call after every change in MongoDB."""
+    _get_token_version_script()(
+        keys=[_token_version_key(user_id)],
+        args=[token_version, _TOKEN_VERSION_TTL_SECONDS],
+    )
+
+
+def revoke_tokens(user_id: str, token_version: str) -> str:
+    """Bump the user's token version so every issued token stops validating, and return the new one.
+
+    Updates in place rather than saving, since callers usually hold a partially loaded user.
+    """
+    new_version = str(int(token_version) + 1)
+    User.objects(id=user_id).update_one(
+        set__token_version=new_version,
+        set__updated_at=datetime.now(timezone.utc),
+    )
+    _remember_token_version(user_id, new_version)
+    return new_version
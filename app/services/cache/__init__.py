@@ -2,23 +2,49 @@ from __future__ import annotations
 
 from typing import Any, Optional
 
-from app.connections.redis import get_redis
+from app.connections.redis import get_async_redis
 
 
-def cache_set(key: str, value: str, ttl_seconds: int | None = None) -> bool:
-    client = get_redis()
+async def cache_set(key: str, value: str, ttl_seconds: int | None = None) -> bool:
+    client = get_async_redis()
     if ttl_seconds is None:
-        return bool(client.set(name=key, value=value))
-    return bool(client.setex(name=key, time=ttl_seconds, value=value))
+        return bool(await client.set(name=key, value=value))
+    return bool(await client.setex(name=key, time=ttl_seconds, value=value))
 
 
-def cache_get(key: str) -> Optional[str]:
-    client = get_redis()
-    return client.get(name=key)
+async def cache_set_if_absent(key: str, value: str, ttl_seconds: int) -> bool:
+    """Set the key only if it does not exist yet; returns False when another writer got there first."""
+    client = get_async_redis()
+    return bool(await client.set(name=key, value=value, ex=ttl_seconds, nx=True))
 
 
-def cache_delete(key: str) -> int:
-    client = get_redis()
-    return int(client.delete(key))
+async def cache_get(key: str) -> Optional[str]:
+    client = get_async_redis()
+    return await client.get(name=key)
 
 
+async def cache_delete(key: str) -> int:
+    client = get_async_redis()
+    return int(await client.delete(key))
+
+
+async def cache_get_many(keys: list[str]) -> list[Optional[str]]:
+    """Fetch several keys in one round-trip; missing keys come back as None."""
+    if not keys:
+        return []
+    client = get_async_redis()
+    return await client.mget(keys)
+
+
+async def cache_set_many(items: dict[str, str], ttl_seconds: int | None = None) -> None:
+    """Write several keys in one pipelined round-trip."""
+    if not items:
+        return
+    client = get_async_redis()
+    async with client.pipeline(transaction=False) as pipe:
+        for key, value in items.items():
+            if ttl_seconds is None:
+                pipe.set(name=key, value=value)
+            else:
+                pipe.setex(name=key, time=ttl_seconds, value=value)
+        await pipe.execute()
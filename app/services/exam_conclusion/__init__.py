@@ -1,124 +1,135 @@
 from datetime import datetime, timezone
-from pymongo import UpdateOne
+from pymongo.write_concern import WriteConcern
 
 from app.models.paper import Paper
 from app.models.exam import Exam, ExamStatus
 from app.models.test_attempt import TestAttempt, TestStatus
-from app.services.scheduler import schedule_at, get_queue
+from app.services.scheduler import schedule_many, get_queue
+
+
+_TRANSITION_FIELDS = ("status", "start_time", "end_time")
+# Only attempts that were started or completed are considered.
+_ACTIVE_STATUSES = (TestStatus.IN_PROGRESS.value, TestStatus.COMPLETED.value)
+
+
+def _paper_max_score(exam: Exam) -> int:
+    """Read the paper's denormalized max_score without dereferencing the whole paper."""
+    paper_ref = exam._data.get("paper")
+    if paper_ref is None:
+        return 0
+    paper: Paper | None = Paper.objects(id=paper_ref.id).only("max_score").first()
+    return int(paper.max_score or 0) if paper else 0
+
+
+def _store_exam_results(exam: Exam) -> None:
+    """Write only the conclusion aggregates instead of re-saving the whole exam."""
+    Exam.objects(id=exam.id).update_one(
+        set__attempted_count=exam.attempted_count,
+        set__highest_score=exam.highest_score,
+        set__lowest_score=exam.lowest_score,
+        set__max_score=exam.max_score,
+        set__concluded_on=exam.concluded_on,
+        set__updated_at=exam.concluded_on,
+    )
+
+
+def _transition_status(exam: Exam, from_status: str, to_status: str, now: datetime) -> bool:
+    """Move the exam between statuses only if it is still in `from_status`; True if this call won."""
+    return bool(Exam.objects(id=exam.id, status=from_status).update_one(set__status=to_status, set__updated_at=now))
 
 
 def conclude_exam(exam_id: str) -> None:
     """
-    Compute ranks/percentiles for an exam at scale using streaming and batched writes.
+    Compute ranks/percentiles for an exam at scale using server-side ranking pipelines.
     """
-    exam: Exam | None = Exam.objects(id=exam_id).first()
+    exam: Exam | None = Exam.objects(id=exam_id).only("paper").first()
     if not exam:
         raise ValueError(f"Exam not found: {exam_id}")
 
     collection = TestAttempt._get_collection()
 
-    # Only attempts that were started or completed are considered.
-    active_statuses = [TestStatus.IN_PROGRESS.value, TestStatus.COMPLETED.value]
-    total_attempts: int = collection.count_documents({"exam": exam.id, "status": {"$in": active_statuses}})
+    attempt_filter = {"exam": exam.id, "status": {"$in": list(_ACTIVE_STATUSES)}}
+    score_expr = {"$toInt": {"$ifNull": ["$total_score", 0]}}
+
+    # Count and score range in one grouped read
+    stats = next(collection.aggregate([
+        {"$match": attempt_filter},
+        {"$group": {"_id": None, "count": {"$sum": 1}, "highest": {"$max": score_expr}, "lowest": {"$min": score_expr}}},
+    ]), {})
+    total_attempts: int = int(stats.get("count") or 0)
     if total_attempts == 0:
         exam.concluded_on = datetime.now(timezone.utc)
         exam.attempted_count = 0
         exam.highest_score = 0
         exam.lowest_score = 0
-        exam.max_score = int(exam.paper.max_score or 0) if getattr(exam, "paper", None) else 0
-        exam.save()
+        exam.max_score = _paper_max_score(exam)
+        _store_exam_results(exam)
         return
-
-    # Overall ranks/percentiles - stream sorted by total_score desc
-    overall_cursor = collection.aggregate([
-        {"$match": {"exam": exam.id, "status": {"$in": active_statuses}}},
-        {"$project": {"total_score": {"$toInt": {"$ifNull": ["$total_score", 0]}}, }},
-        {"$sort": {"total_score": -1}},
+    highest_score = stats.get("highest")
+    lowest_score = stats.get("lowest")
+
+    # Overall and subject-wise ranks/percentiles in a single pass over the attempts, written back server-side.
+    # Standings are recomputable on rerun, so the merge is acknowledged without waiting for the journal.
+    collection.with_options(write_concern=WriteConcern(w=1, j=False)).aggregate([
+        {"$match": attempt_filter},
+        # Sort on the stored field right after the match so the existing (exam, -total_score, id) index serves it
+        {"$setWindowFields": {
+            "sortBy": {"total_score": -1},
+            # Competition rank: ties share a rank and the next distinct score skips ahead
+            "output": {"rank": {"$rank": {}}},
+        }},
+        {"$project": {"rank": 1, "subject_scores": 1}},
+        # One row per subject entry; attempts without subjects are kept so they still get an overall rank
+        {"$unwind": {"path": "$subject_scores", "includeArrayIndex": "subject_idx", "preserveNullAndEmptyArrays": True}},
+        {"$set": {"subject_score": {"$toInt": {"$ifNull": ["$subject_scores.total_score", 0]}}}},
+        {"$setWindowFields": {
+            "partitionBy": "$subject_scores.subject_code",
+            "sortBy": {"subject_score": -1},
+            "output": {
+                "subject_rank": {"$rank": {}},
+                "subject_total": {"$count": {}, "window": {"documents": ["unbounded", "unbounded"]}},
+            },
+        }},
+        # Regroup each attempt's entries in their stored order so the array is rewritten intact
+        {"$sort": {"_id": 1, "subject_idx": 1}},
+        {"$group": {
+            "_id": "$_id",
+            "rank": {"$first": "$rank"},
+            "subject_scores": {"$push": {"$cond": [
+                {"$eq": [{"$type": "$subject_scores"}, "object"]},
+                {"$mergeObjects": ["$subject_scores", {
+                    "rank": "$subject_rank",
+                    "percentile": {"$round": [
+                        {"$divide": [{"$multiply": [100.0, {"$subtract": ["$subject_total", "$subject_rank"]}]}, "$subject_total"]},
+                        4,
+                    ]},
+                }]},
+                None,
+            ]}},
+        }},
+        {"$project": {
+            "rank": 1,
+            "percentile": {"$round": [
+                {"$divide": [{"$multiply": [100.0, {"$subtract": [total_attempts + 1, "$rank"]}]}, total_attempts]},
+                4,
+            ]},
+            "subject_scores": {"$filter": {"input": "$subject_scores", "cond": {"$ne": ["$$this", None]}}},
+        }},
+        {"$merge": {
+            "into": collection.name,
+            "on": "_id",
+            "whenMatched": "merge",
+            "whenNotMatched": "discard",
+        }},
     ], allowDiskUse=True)
 
-    batch_size = 5000
-    operations: list[UpdateOne] = []
-    
-    idx = 0
-    current_rank = 0
-    prev_score = None
-    highest_score = None
-    lowest_score = None
-    for doc in overall_cursor:
-        attempt_id = doc.get("_id")
-        total_score = int(doc.get("total_score") or 0)
-        if highest_score is None:
-            highest_score = total_score
-        lowest_score = total_score
-        if prev_score is None or total_score < prev_score:
-            current_rank = idx
-            prev_score = total_score
-        percentile = round(100.0 * (total_attempts - current_rank) / total_attempts, 4)
-        
-        idx += 1
-        operations.append(UpdateOne(
-            {"_id": attempt_id}, 
-            {"$set": {"rank": current_rank + 1, "percentile": percentile}},
-        ))
-        if len(operations) >= batch_size:
-            collection.bulk_write(operations, ordered=False)
-            operations.clear()
-    if operations:
-        collection.bulk_write(operations, ordered=False)
-        operations.clear()
-
-    # Subject-wise ranks/percentiles: iterate subjects from paper definition
-    paper: Paper | None = exam.paper
-    subjects = [ps.subject_code for ps in (getattr(paper, "subject_max_scores", []) or [])]
-    for subj in subjects:
-        # Count entries with that subject present among active attempts
-        subj_total = collection.count_documents({
-            "exam": exam.id,
-            "status": {"$in": active_statuses},
-            "subject_scores.subject_code": subj,
-        })
-        if subj_total == 0:
-            continue
-        cursor = collection.aggregate([
-            {"$match": {"exam": exam.id, "status": {"$in": active_statuses}}},
-            {"$unwind": "$subject_scores"},
-            {"$match": {"subject_scores.subject_code": subj}},
-            {"$project": {"s": {"$toInt": {"$ifNull": ["$subject_scores.total_score", 0]} }}},
-            {"$sort": {"s": -1}},
-        ], allowDiskUse=True)
-
-        idx = 0
-        current_rank = 0
-        prev_score = None
-        for doc in cursor:
-            attempt_id = doc.get("_id")
-            s = int(doc.get("s") or 0)
-            idx += 1
-            if prev_score is None or s < prev_score:
-                current_rank = idx
-                prev_score = s
-            percentile = round(100.0 * (subj_total - current_rank) / subj_total, 4)
-            # Update embedded element for this subject via arrayFilters
-            operations.append(UpdateOne(
-                {"_id": attempt_id},
-                {"$set": {"subject_scores.$[elem].rank": current_rank, "subject_scores.$[elem].percentile": percentile}},
-                array_filters=[{"elem.subject_code": subj}],
-            ))
-            if len(operations) >= batch_size:
-                collection.bulk_write(operations, ordered=False)
-                operations.clear()
-        if operations:
-            collection.bulk_write(operations, ordered=False)
-            operations.clear()
-
     # Exam aggregates
     exam.attempted_count = total_attempts
     exam.highest_score = int(highest_score or 0)
     exam.lowest_score = int(lowest_score or 0)
-    if paper:
-        exam.max_score = sum(int(pq.positive_score or 0) for pq in paper.paper_questions)
+    exam.max_score = _paper_max_score(exam)
     exam.concluded_on = datetime.now(timezone.utc)
-    exam.save()
+    _store_exam_results(exam)
     print({
         "exam_id": str(exam.id),
         "max_score": exam.max_score,
@@ -130,28 +141,29 @@ def conclude_exam(exam_id: str) -> None:
 
 
 def mark_exam_started(exam_id: str) -> None:
-    exam: Exam | None = Exam.objects(id=exam_id).first()
+    exam: Exam | None = Exam.objects(id=exam_id).only(*_TRANSITION_FIELDS).first()
     if not exam:
         return
     now = datetime.now(timezone.utc)
     if exam.status == ExamStatus.UPCOMING.value and exam.start_time <= now < exam.end_time:
-        exam.status = ExamStatus.ONGOING.value
-        exam.save()
+        _transition_status(exam, ExamStatus.UPCOMING.value, ExamStatus.ONGOING.value, now)
 
 
 def mark_exam_ended(exam_id: str) -> None:
-    exam: Exam | None = Exam.objects(id=exam_id).first()
+    exam: Exam | None = Exam.objects(id=exam_id).only(*_TRANSITION_FIELDS).first()
     if not exam:
         return
     now = datetime.now(timezone.utc)
     if exam.status == ExamStatus.ONGOING.value and exam.end_time <= now:
-        exam.status = ExamStatus.COMPLETED.value
-        exam.save()
-        get_queue().enqueue(conclude_exam, str(exam.id))
+        # Only the job that wins the transition enqueues conclusion, so duplicates cannot double-run it
+        if _transition_status(exam, ExamStatus.ONGOING.value, ExamStatus.COMPLETED.value, now):
+            get_queue().enqueue(conclude_exam, str(exam.id))
 
 
 def schedule_exam_jobs(exam: Exam) -> None:
+    entries = []
     if exam.start_time and exam.status == ExamStatus.UPCOMING.value:
-        schedule_at(exam.start_time, mark_exam_started, str(exam.id))
+        entries.append((exam.start_time, mark_exam_started, (str(exam.id),)))
     if exam.end_time:
-        schedule_at(exam.end_time, mark_exam_ended, str(exam.id))
+        entries.append((exam.end_time, mark_exam_ended, (str(exam.id),)))
+    schedule_many(entries)
@@ -1,27 +1,56 @@
 from __future__ import annotations
 from fastapi import Depends, HTTPException, Request
+from redis.commands.core import AsyncScript
 
-from app.connections.redis import get_redis
+from app.connections.redis import get_async_redis
 from app.services.auth import get_current_user
 from app.models.user import User
 
 
+# The first hit in a window creates the key with its expiry and passes (_ALLOWED); later hits
+# leave the key untouched and get the remaining TTL back. A key that lost its expiry (TTL -1)
+# gets it re-applied so it cannot block forever. Runs atomically server-side, so a check
+# costs one round-trip and cannot race.
+_ALLOWED = -3
+
+_RATE_LIMIT_LUA = """
+if redis.call('SET', KEYS[1], '1', 'EX', ARGV[1], 'NX') then
+    return -3
+end
+local ttl = redis.call('TTL', KEYS[1])
+if ttl == -1 then
+    redis.call('EXPIRE', KEYS[1], ARGV[1])
+    return tonumber(ARGV[1])
+end
+return ttl
+"""
+
+_rate_limit_script: AsyncScript | None = None
+
+
+def _get_rate_limit_script() -> AsyncScript:
+    """Register the rate-limit script once per Redis client and reuse it (EVALSHA)."""
+    global _rate_limit_script
+    client = get_async_redis()
+    if _rate_limit_script is None or _rate_limit_script.registered_client is not client:
+        _rate_limit_script = client.register_script(_RATE_LIMIT_LUA)
+    return _rate_limit_script
+
+
 def limit_route(seconds: int):
     """Return a FastAPI dependency that rate-limits a user on a route for N seconds.
 
-    Uses Redis TTL to block repeated calls by the same user to the same path
-    within the configured time window.
+    Uses a Redis Lua script to block repeated calls by the same user to the same
+    path within the configured time window.
     """
 
-    def _dependency(request: Request, current_user: User = Depends(get_current_user)) -> None:
-        client = get_redis()
+    async def _dependency(request: Request, current_user: User = Depends(get_current_user)) -> None:
         key = f"rl:{current_user.id}:{request.url.path}"
 
-        # If a TTL exists, the user must wait; otherwise set a new TTL.
-        ttl = client.ttl(key)
-        if ttl and ttl > 0:
-            raise HTTPException(status_code=429, detail=f"Rate limited. Try again in {ttl}s")
-        client.setex(name=key, time=seconds, value="1")
+        # Any TTL back means the window is still open and the user must wait.
+        ttl = int(await _get_rate_limit_script()(keys=[key], args=[seconds]))
+        if ttl != _ALLOWED:
+            raise HTTPException(status_code=429, detail=f"Rate limited. Try again in {max(ttl, 1)}s")
 
     return _dependency
 
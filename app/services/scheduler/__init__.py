@@ -1,7 +1,8 @@
 from __future__ import annotations
 
 from datetime import datetime, timezone
-from typing import Callable
+from functools import lru_cache
+from typing import Any, Callable, Iterable
 
 from rq import Queue
 from rq_scheduler import Scheduler
@@ -14,12 +15,23 @@ def _redis_conn() -> Redis:
     return get_redis()
 
 
+# Keyed by connection so a re-initialized Redis client gets fresh instances rather than stale ones
+@lru_cache(maxsize=4)
+def _scheduler_for(connection: Redis) -> Scheduler:
+    return Scheduler(queue_name="scheduler", connection=connection)
+
+
+@lru_cache(maxsize=4)
+def _queue_for(connection: Redis) -> Queue:
+    return Queue(name="scheduler", connection=connection)
+
+
 def get_scheduler() -> Scheduler:
-    return Scheduler(queue_name="scheduler", connection=_redis_conn())
+    return _scheduler_for(_redis_conn())
 
 
 def get_queue() -> Queue:
-    return Queue(name="scheduler", connection=_redis_conn())
+    return _queue_for(_redis_conn())
 
 
 def schedule_at(run_at: datetime, func: Callable, *args, **kwargs) -> None:
@@ -29,3 +41,9 @@ def schedule_at(run_at: datetime, func: Callable, *args, **kwargs) -> None:
     sched.enqueue_at(run_at, func, *args, **kwargs)
 
 
+def schedule_many(entries: Iterable[tuple[datetime, Callable, tuple[Any, ...]]]) -> None:
+    """Schedule several (run_at, func, args) jobs."""
+    for run_at, func, args in entries:
+        schedule_at(run_at, func, *args)
+
+
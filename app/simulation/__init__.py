@@ -1,37 +1,43 @@
 from __future__ import annotations
 
-import json
+import orjson
 import random
 from pathlib import Path
 from typing import Dict, Tuple, Callable, List
 from datetime import datetime, timezone
-from jose import jwt, JWTError
+from jose import JWTError
+from pymongo.errors import BulkWriteError
 
 from app.models.user import User
-from app.utils.config import settings
 from app.models.exam import Exam
 from app.models.submission import Submission
 from app.models.paper import Paper, PaperQuestion
 from app.models.question import Question, QuestionType
 from app.models.test_attempt import TestAttempt, TestStatus, TestType, TestSubjectScore
-from app.services.auth import TokenPair, verify_password, create_tokens, hash_password
+from app.services.auth import TokenPair, decode_token, verify_password, create_tokens, hash_password, revoke_tokens
 from app.services.exam_conclusion import conclude_exam
 
 
 _STATE_PATH = Path(__file__).with_name("state.json")
+_SINGLE = QuestionType.SINGLE_CORRECT.value
+_MULTI = QuestionType.MULTIPLE_CORRECT.value
 
 
 def _load_state() -> dict:
     if _STATE_PATH.exists():
         try:
-            return json.loads(_STATE_PATH.read_text())
+            return orjson.loads(_STATE_PATH.read_bytes())
         except Exception:
             return {}
     return {}
 
 
 def _save_state(state: dict) -> None:
-    _STATE_PATH.write_text(json.dumps(state, indent=2))
+    data = orjson.dumps(state, option=orjson.OPT_INDENT_2)
+    # Leave the file untouched when nothing changed
+    if _STATE_PATH.exists() and _STATE_PATH.read_bytes() == data:
+        return
+    _STATE_PATH.write_bytes(data)
 
 
 def _ensure_section(state: dict, section: str) -> dict:
@@ -44,17 +50,17 @@ def _ensure_section(state: dict, section: str) -> dict:
     return state[section]
 
 
-def signup_user(name: str, email: str, password: str) -> TokenPair:
-    existing = User.objects(email=email).first()
+def signup_user(name: str, email: str, password: str) -> Tuple[TokenPair, User]:
+    existing = User.objects(email=email).only("id").first()
     if existing:
         raise ValueError("Email already registered")
     user = User(name=name, email=email, password=hash_password(password))
     user.save()
-    return create_tokens(user)
+    return create_tokens(user), user
 
 
 def login_user(email: str, password: str) -> TokenPair:
-    user = User.objects(email=email).first()
+    user = User.objects(email=email).only("password", "token_version").first()
     if not user or not verify_password(password, user.password):
         raise ValueError("Invalid credentials")
     return create_tokens(user)
@@ -62,7 +68,7 @@ def login_user(email: str, password: str) -> TokenPair:
 
 def logout_user(access_token: str) -> Dict[str, bool]:
     try:
-        payload = jwt.decode(access_token, settings.jwt_secret_key, algorithms=[settings.jwt_algorithm])
+        payload = decode_token(access_token)
         user_id: str | None = payload.get("sub")
         token_type: str | None = payload.get("typ")
         if not user_id or token_type != "access":
@@ -70,17 +76,15 @@ def logout_user(access_token: str) -> Dict[str, bool]:
     except JWTError as exc:
         raise ValueError("Invalid token") from exc
 
-    user = User.objects(id=user_id).first()
+    user = User.objects(id=user_id).only("token_version").first()
     if not user:
         raise ValueError("User not found")
 
-    user.token_version = str(int(user.token_version) + 1)
-    user.save()
+    revoke_tokens(str(user.id), user.token_version)
     return {"status": True}
 
 
-def sim_signup_user() -> None:
-    state = _load_state()
+def _sim_signup_user(state: dict) -> None:
     section = _ensure_section(state, "signup_user")
     inp = section["input"]
     try:
@@ -89,21 +93,18 @@ def sim_signup_user() -> None:
         password = inp.get("password")
         if not all([name, email, password]):
             raise ValueError("signup_user.input requires name, email, password")
-        tokens = signup_user(name=name, email=email, password=password)
-        user = User.objects(email=email).first()
+        tokens, user = signup_user(name=name, email=email, password=password)
         section["output"] = {
-            "user_id": str(user.id) if user else None,
+            "user_id": str(user.id),
             "access_token": tokens.access_token,
             "refresh_token": tokens.refresh_token,
             "token_type": tokens.token_type,
         }
     except Exception as exc:
         section["output"] = {"error": str(exc)}
-    _save_state(state)
 
 
-def sim_login_user() -> None:
-    state = _load_state()
+def _sim_login_user(state: dict) -> None:
     section = _ensure_section(state, "login_user")
     inp = section["input"]
     try:
@@ -124,11 +125,9 @@ def sim_login_user() -> None:
         }
     except Exception as exc:
         section["output"] = {"error": str(exc)}
-    _save_state(state)
 
 
-def sim_logout_user() -> None:
-    state = _load_state()
+def _sim_logout_user(state: dict) -> None:
     section = _ensure_section(state, "logout_user")
     inp = section["input"]
     try:
@@ -144,58 +143,91 @@ def sim_logout_user() -> None:
         section["output"] = result
     except Exception as exc:
         section["output"] = {"error": str(exc)}
+
+
+def _with_state(func: Callable[[dict], None]) -> None:
+    state = _load_state()
+    func(state)
     _save_state(state)
 
 
+def sim_signup_user() -> None:
+    _with_state(_sim_signup_user)
+
+
+def sim_login_user() -> None:
+    _with_state(_sim_login_user)
+
+
+def sim_logout_user() -> None:
+    _with_state(_sim_logout_user)
+
+
 def run_from_state() -> None:
+    # Load once, thread the same state through every step, and write it back once
     state = _load_state()
     funcs = state.get("funcs_to_run") or []
-    name_to_func: Dict[str, Callable[[], None]] = {
-        "signup_user": sim_signup_user,
-        "login_user": sim_login_user,
-        "logout_user": sim_logout_user,
+    name_to_func: Dict[str, Callable[[dict], None]] = {
+        "signup_user": _sim_signup_user,
+        "login_user": _sim_login_user,
+        "logout_user": _sim_logout_user,
     }
     for name in funcs:
         func = name_to_func.get(name)
         if not func:
             continue
-        func()
+        func(state)
+    _save_state(state)
 
 
-def _score_submission(paper: Paper, question: Question, options_chosen: List[str]) -> Tuple[int, int]:
-    """Mirror API scoring: returns (score, max_score) for this question in paper."""
+def _option_index(question: Question) -> Tuple[Dict[str, object], set]:
+    """(option code -> option, correct option codes) for a question; built once per paper."""
     by_code = {opt.code: opt for opt in question.question_options}
-    chosen_set = set(options_chosen or [])
     correct_set = {opt.code for opt in question.question_options if getattr(opt, "correct", False)}
+    return by_code, correct_set
 
-    for pq in paper.paper_questions:
-        if pq.question.code != question.code:
-            continue
-        # Any invalid or wrong selection yields negative
-        if any(code not in by_code for code in chosen_set):
-            return (-int(pq.negative_score), pq.positive_score)
-        if chosen_set - correct_set:
-            return (-int(pq.negative_score), pq.positive_score)
-
-        qtype = str(question.type)
-        if qtype == QuestionType.SINGLE_CORRECT.value:
-            if not chosen_set:
-                return (0, pq.positive_score)
-            return (int(pq.positive_score), pq.positive_score)
-        if qtype == QuestionType.MULTIPLE_CORRECT.value:
-            total_weight = 0
-            for code in chosen_set:
-                opt = by_code.get(code)
-                if getattr(opt, "correct", False):
-                    total_weight += int(getattr(opt, "weight", 0) or 0)
-            score = (total_weight * pq.positive_score) / 100
-            return (int(score), pq.positive_score)
-        return (0, pq.positive_score)
-    # Not in paper
-    return (0, 0)
-
-
-def _strategy_choices(question: Question, strategy: str) -> List[str]:
+
+def _score_submission(
+    pq: PaperQuestion,
+    question: Question,
+    options_chosen: List[str],
+    option_index: Tuple[Dict[str, object], set],
+) -> Tuple[int, int]:
+    """Mirror API scoring: returns (score, max_score) for this paper question."""
+    by_code, correct_set = option_index
+    chosen_set = set(options_chosen or [])
+
+    # Any invalid or wrong selection yields negative
+    if any(code not in by_code for code in chosen_set):
+        return (-int(pq.negative_score), pq.positive_score)
+    if not chosen_set.issubset(correct_set):
+        return (-int(pq.negative_score), pq.positive_score)
+
+    qtype = str(question.type)
+    if qtype == _SINGLE:
+        if not chosen_set:
+            return (0, pq.positive_score)
+        return (int(pq.positive_score), pq.positive_score)
+    if qtype == _MULTI:
+        total_weight = 0
+        for code in chosen_set:
+            opt = by_code.get(code)
+            if getattr(opt, "correct", False):
+                total_weight += int(getattr(opt, "weight", 0) or 0)
+        score = (total_weight * pq.positive_score) / 100
+        return (int(score), pq.positive_score)
+    return (0, pq.positive_score)
+
+
+def _choice_pools(question: Question) -> Tuple[List[str], List[str], List[str], str]:
+    """(all codes, correct codes, wrong codes, question type) for a question; built once per paper."""
+    codes = [opt.code for opt in question.question_options]
+    correct_codes = [opt.code for opt in question.question_options if getattr(opt, "correct", False)]
+    wrong_codes = [c for c in codes if c not in correct_codes]
+    return codes, correct_codes, wrong_codes, str(question.type)
+
+
+def _strategy_choices(pools: Tuple[List[str], List[str], List[str], str], strategy: str) -> List[str]:
     """Deterministic choice generator to enforce ranking order across users.
 
     Strategies:
@@ -203,18 +235,15 @@ def _strategy_choices(question: Question, strategy: str) -> List[str]:
     - mid: mostly correct (single: correct 80%; multi: all correct 70% else only correct subset)
     - low: mostly wrong (single: always wrong; multi: include a wrong option to force negative)
     """
-    codes = [opt.code for opt in question.question_options]
-    correct_codes = [opt.code for opt in question.question_options if getattr(opt, "correct", False)]
-    wrong_codes = [c for c in codes if c not in correct_codes]
+    codes, correct_codes, wrong_codes, qtype = pools
 
-    qtype = str(question.type)
     if strategy == "top":
-        if qtype == QuestionType.SINGLE_CORRECT.value:
+        if qtype == _SINGLE:
             return [correct_codes[0]] if correct_codes else [random.choice(codes)]
         return list(correct_codes) if correct_codes else random.sample(codes, k=max(1, len(codes)//2))
 
     if strategy == "mid":
-        if qtype == QuestionType.SINGLE_CORRECT.value:
+        if qtype == _SINGLE:
             return [correct_codes[0]] if correct_codes and random.random() < 0.8 else [random.choice(wrong_codes or codes)]
         # multi: prefer only correct subset to get positive but < full marks
         if correct_codes:
@@ -223,7 +252,7 @@ def _strategy_choices(question: Question, strategy: str) -> List[str]:
         return random.sample(codes, k=1)
 
     # low strategy
-    if qtype == QuestionType.SINGLE_CORRECT.value:
+    if qtype == _SINGLE:
         return [random.choice(wrong_codes or codes)]
     # multi: force negative by including a wrong option (and maybe some corrects)
     pick = []
@@ -244,13 +273,24 @@ def simulate_exam_for_dummy_users(exam_id: str) -> dict:
         raise ValueError("Exam paper not found")
 
     # Ensure three users exist; pick the first 3 by created time
-    users = list(User.objects.order_by("created_at").limit(3))
+    users = list(User.objects.order_by("created_at").only("id", "name", "email").limit(3))
     if len(users) < 3:
         raise ValueError("Not enough users to simulate")
 
+    # Option lookups and score maxima depend only on the paper, so build them once for all users
+    option_index_by_qcode = {pq.question.code: _option_index(pq.question) for pq in paper.paper_questions}
+    choice_pools_by_qcode = {pq.question.code: _choice_pools(pq.question) for pq in paper.paper_questions}
+    paper_max = int(getattr(paper, "max_score", 0) or 0)
+    subj_max_map = {ps.subject_code: int(ps.max_score or 0) for ps in (paper.subject_max_scores or [])}
+    ordered_pqs = sorted(paper.paper_questions, key=lambda x: x.order)
+
     results: dict[str, str] = {}
     for idx, user in enumerate(users):
-        # Enroll if missing
+        # One clock read covers enrollment, start and the answers; the end gets its own
+        now = datetime.now(timezone.utc)
+        # Enforce ranking order: user index 2 > 0 > 1
+        strategy = "top" if idx == 2 else ("mid" if idx == 0 else "low")
+        # Enroll if missing; the attempt is stored before its submissions so none can be orphaned
         attempt: TestAttempt | None = TestAttempt.objects(exam=exam, user=user).first()
         if not attempt:
             # Pre-initialize subject buckets to satisfy non-empty constraint
@@ -267,62 +307,69 @@ def simulate_exam_for_dummy_users(exam_id: str) -> dict:
                 user=user,
                 type=TestType.COMPETITIVE.value,
                 status=TestStatus.NOT_STARTED.value,
-                enrolled_on=datetime.now(timezone.utc),
+                enrolled_on=now,
                 subject_scores=initial_subject_scores,
-            )
-            attempt.save()
+            ).save()
 
-        # Start attempt
-        attempt.started_on = datetime.now(timezone.utc)
-        attempt.status = TestStatus.IN_PROGRESS.value
-        attempt.save()
+        # Questions already answered on a previous run are skipped up front rather than via duplicate errors
+        answered = set(Submission._get_collection().distinct("question", {"test_attempt": attempt.id}))
 
-        # Answer all questions in order with random choices
-        for pq in sorted(paper.paper_questions, key=lambda x: x.order):
+        # Answer all questions in order with random choices, as raw submission documents
+        subs: list[dict] = []
+        for pq in ordered_pqs:
             question: Question = pq.question
-            # Enforce ranking order: user index 2 > 0 > 1
-            strategy = "top" if idx == 2 else ("mid" if idx == 0 else "low")
-            choices = _strategy_choices(question, strategy)
-            score, max_score = _score_submission(paper, question, choices)
-            sub = Submission(
-                score=int(score),
-                user=user,
-                paper=paper,
-                question=question,
-                test_attempt=attempt,
-                max_score=int(max_score),
-                options_chosen=choices,
-                subject_code=str(question.subject_code),
-            )
-            try:
-                sub.save()
-            except Exception:
-                # duplicate for same question; skip
+            if question.id in answered:
                 continue
-
-            # Lightweight aggregate updates (mirror API)
-            attempt.total_score = int(attempt.total_score or 0) + int(score)
-            paper_max = int(getattr(paper, "max_score", 0) or 0)
-            if int(attempt.max_total_score or 0) != paper_max:
-                attempt.max_total_score = paper_max
-
-            subj_code = str(question.subject_code)
-            subj_max_map = {ps.subject_code: int(ps.max_score or 0) for ps in (paper.subject_max_scores or [])}
-            subj_max = subj_max_map.get(subj_code, 0)
-            by_subj = {ss.subject_code: ss for ss in (attempt.subject_scores or [])}
+            choices = _strategy_choices(choice_pools_by_qcode[question.code], strategy)
+            score, max_score = _score_submission(pq, question, choices, option_index_by_qcode[question.code])
+            subs.append({
+                "user": user.id,
+                "paper": paper.id,
+                "question": question.id,
+                "test_attempt": attempt.id,
+                "options_chosen": list(choices),
+                "subject_code": str(question.subject_code),
+                "submitted_at": now,
+                "max_score": int(max_score),
+                "score": int(score),
+                "metadata": {},
+                "created_at": now,
+                "updated_at": now,
+            })
+
+        # One unordered bulk insert per attempt; duplicates are skipped and left out of the totals
+        if subs:
+            try:
+                Submission._get_collection().insert_many(subs, ordered=False)
+            except BulkWriteError as exc:
+                failed = {err["index"] for err in exc.details.get("writeErrors", [])}
+                subs = [sub for i, sub in enumerate(subs) if i not in failed]
+
+        # Settle totals locally (mirror API aggregates), then fold them into the attempt
+        local_total = 0
+        subj_totals: dict[str, int] = {}
+        for sub in subs:
+            local_total += sub["score"]
+            subj_totals[sub["subject_code"]] = subj_totals.get(sub["subject_code"], 0) + sub["score"]
+
+        attempt.total_score = int(attempt.total_score or 0) + local_total
+        attempt.max_total_score = paper_max
+        by_subj = {ss.subject_code: ss for ss in (attempt.subject_scores or [])}
+        for subj_code, subj_total in subj_totals.items():
+            subj_max = int(subj_max_map.get(subj_code, 0))
             current = by_subj.get(subj_code)
             if current:
-                current.total_score = int(getattr(current, "total_score", 0) or 0) + int(score)
-                current.max_total_score = int(subj_max)
+                current.total_score = int(getattr(current, "total_score", 0) or 0) + subj_total
+                current.max_total_score = subj_max
             else:
                 attempt.subject_scores.append(TestSubjectScore(
                     subject_code=subj_code,
-                    total_score=int(score),
-                    max_total_score=int(subj_max),
+                    total_score=subj_total,
+                    max_total_score=subj_max,
                 ))
-            attempt.save()
 
-        # End attempt
+        # Start, scores and end land in a single update
+        attempt.started_on = now
         attempt.status = TestStatus.COMPLETED.value
         attempt.ended_on = datetime.now(timezone.utc)
         attempt.save()
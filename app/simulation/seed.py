@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 import random
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
 
 from app.connections.mongo import init_mongo, close_mongo
@@ -12,6 +13,17 @@ from app.services.auth import hash_password
 from app.utils.base import SubjectCode
 
 
+def _insert_new(model: type, docs: list) -> None:
+    """Validate (running clean()) and bulk-insert new documents, then assign their ids."""
+    if not docs:
+        return
+    for doc in docs:
+        doc.validate()
+    ids = model.objects.insert(docs, load_bulk=False)
+    for doc, doc_id in zip(docs, ids):
+        doc.id = doc_id
+
+
 def _ensure_users() -> list[User]:
     users: list[User] = []
     fixtures = [
@@ -19,12 +31,15 @@ def _ensure_users() -> list[User]:
         ("Bob Example", "bob@example.com", "Secret123!"),
         ("Carol Example", "carol@example.com", "Secret123!"),
     ]
+    existing = {u.email: u for u in User.objects(email__in=[email for _, email, _ in fixtures])}
+    to_create: list[User] = []
     for name, email, pwd in fixtures:
-        user = User.objects(email=email).first()
+        user = existing.get(email)
         if not user:
             user = User(name=name, email=email, password=hash_password(pwd))
-            user.save()
+            to_create.append(user)
         users.append(user)
+    _insert_new(User, to_create)
     return users
 
 
@@ -33,11 +48,14 @@ def _ensure_questions() -> tuple[list[Question], list[Question]]:
     multis: list[Question] = []
 
     subjects = [s.value for s in SubjectCode]
+    codes = [f"S{i:03d}" for i in range(1, 101)] + [f"M{i:03d}" for i in range(1, 26)]
+    existing = {q.code: q for q in Question.objects(code__in=codes)}
+    to_create: list[Question] = []
 
     # Create 100 single-correct
     for i in range(1, 101):
         code = f"S{i:03d}"
-        q = Question.objects(code=code).first()
+        q = existing.get(code)
         if not q:
             opts = []
             correct_index = random.randint(0, 3)
@@ -57,13 +75,13 @@ def _ensure_questions() -> tuple[list[Question], list[Question]]:
                 statement=f"Single-correct question {i}",
                 question_options=opts,
             )
-            q.save()
+            to_create.append(q)
         singles.append(q)
 
     # Create 25 multi-correct
     for i in range(1, 26):
         code = f"M{i:03d}"
-        q = Question.objects(code=code).first()
+        q = existing.get(code)
         if not q:
             opts = []
             # choose 2-3 correct options, weights must sum to exactly 100
@@ -93,18 +111,21 @@ def _ensure_questions() -> tuple[list[Question], list[Question]]:
                 statement=f"Multi-correct question {i}",
                 question_options=opts,
             )
-            q.save()
+            to_create.append(q)
         multis.append(q)
 
+    _insert_new(Question, to_create)
     return singles, multis
 
 
 def _ensure_papers(singles: list[Question], multis: list[Question]) -> list[Paper]:
     papers: list[Paper] = []
     all_questions = singles + multis
+    existing = {p.code: p for p in Paper.objects(code__in=[f"PAPER{i:02d}" for i in range(1, 26)])}
+    to_create: list[Paper] = []
     for i in range(1, 26):
         code = f"PAPER{i:02d}"
-        p = Paper.objects(code=code).first()
+        p = existing.get(code)
         if not p:
             # choose 10 questions, ensure some multis may appear; questions can repeat across papers
             selected = random.sample(all_questions, k=10)
@@ -138,8 +159,9 @@ def _ensure_papers(singles: list[Question], multis: list[Question]) -> list[Pape
                 duration_minutes=60,
                 paper_questions=pq,
             )
-            p.save()
+            to_create.append(p)
         papers.append(p)
+    _insert_new(Paper, to_create)
     return papers
 
 
@@ -169,18 +191,15 @@ def _ensure_exams(papers: list[Paper]) -> list[Exam]:
 def seed() -> None:
     init_mongo()
     try:
-        # Purge existing data in an order that respects references
+        # Purge existing data; MongoDB does not enforce references, so the drops can run concurrently
         from app.models.submission import Submission
         from app.models.test_attempt import TestAttempt
         from app.models.exam import Exam
         from app.models.paper import Paper
         from app.models.question import Question
-        Submission.drop_collection()
-        TestAttempt.drop_collection()
-        Exam.drop_collection()
-        Paper.drop_collection()
-        Question.drop_collection()
-        User.drop_collection()
+        models = [Submission, TestAttempt, Exam, Paper, Question, User]
+        with ThreadPoolExecutor(max_workers=len(models)) as executor:
+            list(executor.map(lambda model: model.drop_collection(), models))
 
         # create users and domain data
         _ensure_users()
@@ -1,3 +1,5 @@
+from functools import cached_property
+
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -12,6 +14,9 @@ class Settings(BaseSettings):
     mongo_password: str | None = None
     mongo_params: str | None = None
     mongo_user: str | None = None
+    mongo_max_pool_size: int = 200
+    mongo_min_pool_size: int = 20
+    mongo_compressors: str = "zstd,zlib"
 
     jwt_algorithm: str = "HS256"
     jwt_secret_key: str = "very-secret-key"
@@ -22,10 +27,11 @@ class Settings(BaseSettings):
     redis_port: int = 6379
     redis_host: str = "localhost"
     redis_password: str | None = None
+    redis_max_connections: int = 100
 
     model_config = SettingsConfigDict(env_file=(".env",), case_sensitive=True)
 
-    @property
+    @cached_property
     def mongo_uri(self) -> str:
         auth = ""
         if self.mongo_user and self.mongo_password:
@@ -1,4 +1,5 @@
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
 from contextlib import AsyncExitStack
 
 from app.connections import mongo_lifespan
@@ -16,7 +17,12 @@ async def combined_lifespan(app: FastAPI):
         yield
 
 
-app = FastAPI(title="Exams Platform (Mongo)", version="0.1.0", lifespan=combined_lifespan)
+app = FastAPI(
+    title="Exams Platform (Mongo)",
+    version="0.1.0",
+    lifespan=combined_lifespan,
+    default_response_class=ORJSONResponse,
+)
 
 
 app.include_router(user_router, prefix="/api/users")